@@ -1,13 +1,61 @@
 #!/usr/bin/env python3
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import re
+import string
 import argparse
 import sys
 import os
-from typing import List, Dict
-from pathlib import Path
-from typing import List, Dict
-from datetime import datetime
+import io
+import time
+import functools
+from typing import List, Dict, Iterator
+from operator import itemgetter
+from stat import S_ISREG
+from concurrent.futures import ThreadPoolExecutor
+
+# Prefer orjson, then ujson; both are much faster than the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+def _stdlib_dumps(obj, indent: bool = False) -> str:
+    """Serialize with the stdlib json module, spaced the same way as orjson output"""
+    if indent:
+        return json.dumps(obj, indent=2, separators=(",", ": "))
+    return json.dumps(obj, separators=(",", ":"))
+
+def _dumps(obj, indent: bool = False) -> str:
+    """Serialize to a JSON string with the fastest available library"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+        except TypeError:
+            # orjson rejects lone surrogates (e.g. undecodable file names); json escapes them
+            return _stdlib_dumps(obj, indent)
+    if ujson is not None:
+        return ujson.dumps(obj, indent=2 if indent else 0, escape_forward_slashes=False)
+    return _stdlib_dumps(obj, indent)
+
+def _dumps_bytes(obj) -> bytes:
+    """Serialize to JSON bytes, avoiding a decode/encode round trip with orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _dumps(obj).encode()
+
+if orjson is not None:
+    _loads = orjson.loads
+elif ujson is not None:
+    _loads = ujson.loads
+else:
+    _loads = json.loads
 
 def create_filesystem_tool():
     return {
@@ -96,111 +144,179 @@ def normalize_extension(extension: str) -> str:
     ext = extension.lower()
     return f".{ext.lstrip('.')}"
 
-def normalize_path(path_str: str) -> Path:
-    """Safely normalize and resolve various path formats"""
+_SPECIAL_PATHS = {
+    'current': os.getcwd,
+    '.': os.getcwd,
+    '': os.getcwd,
+    '..': lambda: os.path.dirname(os.getcwd()),
+}
+
+_VALID_DRIVES = frozenset(f"{d}:" for d in string.ascii_lowercase)
+
+_DRIVE_ROOT_RE = re.compile(r"[a-z]:\\?")
+
+def normalize_path(path_str: str) -> str:
+    """Safely normalize various path formats to an absolute path string"""
     try:
+        s = path_str.lower()
         # Handle special cases
-        if path_str.lower() in ['current', '.']:
-            return Path.cwd()
-        elif path_str == '..':
-            return Path.cwd().parent
-        elif path_str.lower().endswith(':'):  # Handle drive root like 'D:'
+        special = _SPECIAL_PATHS.get(s)
+        if special is not None:
+            return special()
+        elif _DRIVE_ROOT_RE.fullmatch(s):  # Handle drive root like 'D:' or 'D:\'
             # Add backslash to ensure root directory
-            return Path(f"{path_str}\\").resolve()
-        elif path_str.lower().endswith(':\\'):  # Handle drive root like 'D:\'
-            return Path(path_str).resolve()
-        elif path_str.lower() in ['current', '.', '']:
-            return Path.cwd()
+            return os.path.abspath(f"{path_str[:2]}\\")
         else:
-            # Handle relative paths
-            return Path(path_str).resolve()
+            # Handle relative paths; abspath is purely lexical, so no syscalls
+            return os.path.abspath(path_str)
     except Exception as e:
         raise ValueError(f"Invalid path format: {str(e)}")
 
+_extension_regexes: Dict[str, re.Pattern] = {}
+
+def extension_regex(normalized_ext: str) -> re.Pattern:
+    """Return a cached case-insensitive pattern matching names ending in the extension"""
+    regex = _extension_regexes.get(normalized_ext)
+    if regex is None:
+        regex = _extension_regexes[normalized_ext] = re.compile(re.escape(normalized_ext) + r"\Z", re.IGNORECASE)
+    return regex
+
+def scan_files(root, normalized_ext: str = None, recursive: bool = False) -> Iterator[os.DirEntry]:
+    """Yield file entries under root in a single scandir pass, optionally filtered by extension"""
+    # DirEntry caches the dirent type, so the is_file/is_dir checks don't stat
+    ext_match = extension_regex(normalized_ext).search if normalized_ext else None
+    if not recursive:
+        with os.scandir(root) as entries:
+            if ext_match is None:
+                files = [entry for entry in entries if entry.is_file()]
+            else:
+                files = [entry for entry in entries if entry.is_file() and ext_match(entry.name)]
+        yield from files
+        return
+    
+    # An explicit scandir stack rather than os.walk, which discards the DirEntry
+    # objects whose cached stat results the caller reuses
+    def scan_directory(directory) -> List[os.DirEntry]:
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file() and (ext_match is None or ext_match(entry.name)):
+                    files.append(entry)
+        return files
+    
+    # Errors opening the root are reported; unreadable subdirectories are skipped
+    pending = []
+    yield from scan_directory(root)
+    while pending:
+        try:
+            files = scan_directory(pending.pop())
+        except OSError:
+            continue
+        yield from files
+
+@functools.lru_cache(maxsize=4096)
+def format_timestamp(seconds: int) -> str:
+    """Format a timestamp as local ISO 8601, cached since many files share one"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds))
+
 def list_files(path_str: str, extension: str = None, recursive: bool = False) -> Dict:
     """List files with enhanced path handling"""
     try:
-        try:
-            path = normalize_path(path_str)
-        except ValueError as e:
-            return {"error": f"Error with path: {str(e)}"}
-        
-        if not path.exists():
-            return {"error": f"Error: Path '{path}' does not exist"}
-            
-        # Add safety check for drive access
-        if not any(path.drive.lower() == f"{d}:" for d in 'abcdefghijklmnopqrstuvwxyz'):
-            return {"error": f"Error: Invalid drive in path '{path}'"}
-        
-        files = []
+        path = normalize_path(path_str)
+    except ValueError as e:
+        return {"error": f"Error with path: {str(e)}"}
+    
+    # Add safety check for drive access; POSIX paths have no drive to check
+    if os.name == 'nt' and os.path.splitdrive(path)[0].lower() not in _VALID_DRIVES:
+        return {"error": f"Error: Invalid drive in path '{path}'"}
+    
+    files = []
+    
+    # scandir reports missing or invalid paths itself, so there's no upfront exists() check
+    try:
         normalized_ext = normalize_extension(extension) if extension else None
-        pattern = f"*{normalized_ext}" if normalized_ext else "*"
-        
-        try:
-            if recursive:
-                file_paths = path.rglob(pattern)
-            else:
-                file_paths = path.glob(pattern)
-                
-            for file_path in file_paths:
-                if file_path.is_file():
-                    file_info = {
-                        "file_name": file_path.name,
-                        "date_created": datetime.fromtimestamp(file_path.stat().st_ctime).isoformat(),
-                        "date_modified": datetime.fromtimestamp(file_path.stat().st_mtime).isoformat(),
-                        "file_type": file_path.suffix
-                    }
-                    files.append(file_info)
-            
-            # Sort files for consistent output
-            files.sort(key=lambda x: x["file_name"])
-            
-            return {
-                "starting_path": str(path),
-                "file_count": len(files),
-                "files": files
+        for entry in scan_files(path, normalized_ext, recursive):
+            stat = entry.stat()
+            file_info = {
+                "file_name": entry.name,
+                "date_created": format_timestamp(int(stat.st_ctime)),
+                "date_modified": format_timestamp(int(stat.st_mtime)),
+                "file_type": os.path.splitext(entry.name)[1]
             }
-            
-        except PermissionError:
-            return {"error": f"Permission denied accessing some paths in '{path}'"}
-        except Exception as e:
-            return {"error": f"Error during file search in '{path}': {str(e)}"}
-            
+            files.append(file_info)
+    except FileNotFoundError:
+        return {"error": f"Error: Path '{path}' does not exist"}
+    except NotADirectoryError:
+        return {"error": f"Error: Path '{path}' is not a directory"}
+    except PermissionError:
+        return {"error": f"Permission denied accessing some paths in '{path}'"}
     except Exception as e:
-        return {"error": f"Error with path handling: {str(e)}"}
+        return {"error": f"Error during file search in '{path}': {str(e)}"}
     
+    # Sort files for consistent output
+    files.sort(key=itemgetter("file_name"))
+    
+    return {
+        "starting_path": path,
+        "file_count": len(files),
+        "files": files
+    }
+
+FILE_DELIMITER = "==========="
+
+_OPEN_FLAGS = getattr(os, "O_BINARY", 0) | getattr(os, "O_NONBLOCK", 0)
+
+def read_file_section(file_path_str: str) -> str:
+    """Read a single file and render it as a delimited section, or an error line"""
+    invalid = f"Error: '{file_path_str}' is not a valid file"
+    try:
+        # Open first and fstat the descriptor rather than stat-ing the path beforehand;
+        # O_NONBLOCK keeps a FIFO from blocking the open before it can be rejected
+        fd = os.open(file_path_str, os.O_RDONLY | _OPEN_FLAGS)
+        with os.fdopen(fd, 'rb') as file:
+            # Only regular files, so devices like /dev/zero aren't read without end
+            if not S_ISREG(os.fstat(fd).st_mode):
+                return invalid
+            file_content = file.read().decode('utf-8', errors='replace')
+        file_path = os.path.abspath(file_path_str).replace(os.sep, "/")
+        return f"{FILE_DELIMITER}{file_path}\n{file_content}"
+    except (FileNotFoundError, IsADirectoryError):
+        return invalid
+    except PermissionError as e:
+        # Windows reports opening a directory as a permission error
+        if os.path.isdir(file_path_str):
+            return invalid
+        return f"Error reading file '{file_path_str}': {str(e)}"
+    except Exception as e:
+        return f"Error reading file '{file_path_str}': {str(e)}"
+
 def read_files(file_paths: List[str]) -> str:
     """Read a batch of one or more files and return their text with a delimiter"""
-    result = []
-    delimiter = "==========="
-    for file_path_str in file_paths:
-        try:
-            file_path = Path(file_path_str).resolve()
-            if not file_path.is_file():
-                result.append(f"Error: '{file_path_str}' is not a valid file")
-                continue
-            with open(file_path, 'r', encoding='utf-8') as file:
-                file_content = file.read()
-                result.append(f"{delimiter}{file_path.as_posix()}\n{file_content}")
-        except Exception as e:
-            result.append(f"Error reading file '{file_path_str}': {str(e)}")
+    if not file_paths:
+        return ""
+    # File reads release the GIL, so a batch can be read concurrently; map keeps input order
+    with ThreadPoolExecutor(max_workers=min(32, len(file_paths))) as executor:
+        result = list(executor.map(read_file_section, file_paths))
     return "\n".join(result)
 
-scratch_buffer = ""
+# StringIO appends in place so adding text doesn't re-copy the whole buffer
+scratch_buffer = io.StringIO()
 
 def add_to_scratch_buffer(text: str) -> None:
     """Add a string to the scratch buffer"""
-    global scratch_buffer
-    scratch_buffer += text + "\n\n"
+    scratch_buffer.write(text)
+    scratch_buffer.write("\n\n")
 
 def get_scratch_buffer() -> str:
     """Retrieve the entire contents of the scratch buffer"""
-    return scratch_buffer
+    return scratch_buffer.getvalue()
 
 def create_tool_prompt(tools: List[Dict]):
     tool_descriptions = []
     for tool in tools:
-        tool_descriptions.append(f"Use the function '{tool['name']}' to '{tool['description']}':\n{json.dumps(tool)}")
+        tool_descriptions.append(f"Use the function '{tool['name']}' to '{tool['description']}':\n{_dumps(tool)}")
     
     tools_text = "\n\n".join(tool_descriptions)
     
@@ -226,118 +342,121 @@ Example usage for listing files:
 - Find JavaScript files in specific directory: <function=list_directory>{{"path": "src", "extension": ".js"}}</function>
 """
 
+_FUNCTION_CALL_RE = re.compile(r"<function=([^>]+)>(.*?)(?:</function>|$)", re.DOTALL)
+
 def extract_function_call(response: str) -> tuple[str, dict]:
     """Extract function name and parameters from the model response more robustly"""
     try:
-        # Handle case where closing tag is missing
-        if response.startswith("<function="):
-            # Extract function name
-            start_idx = len("<function=")
-            end_idx = response.find(">", start_idx)
-            if end_idx == -1:
-                raise ValueError("Invalid function call format - missing closing '>'")
-            function_name = response[start_idx:end_idx]
-            
-            # Extract parameters - look for JSON object
-            params_str = response[end_idx + 1:]
-            # Remove closing tag if it exists
-            params_str = params_str.split("</function>")[0]
-            
-            # If params_str is empty, return empty dict
-            if not params_str.strip():
-                return function_name, {}
-            
-            # Try to parse parameters as JSON
-            try:
-                params = json.loads(params_str)
-                return function_name, params
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Invalid JSON parameters: {e}")
-        else:
-            raise ValueError("Response does not start with '<function='")
+        # Closing tag is optional since the model sometimes drops it
+        match = _FUNCTION_CALL_RE.match(response)
+        if match is None:
+            raise ValueError("Response does not match '<function=name>{...}</function>'")
+        function_name, params_str = match.groups()
+        
+        # If params_str is empty, return empty dict
+        if not params_str.strip():
+            return function_name, {}
+        
+        # Try to parse parameters as JSON
+        try:
+            params = _loads(params_str)
+            return function_name, params
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON parameters: {e}")
     except Exception as e:
         raise ValueError(f"Error parsing function call: {e}")
 
+_TOOL_HANDLERS = {
+    "list_directory": lambda params: _dumps(list_files(
+        params["path"],
+        params.get("extension"),
+        params.get("recursive", False)
+    ), indent=True),
+    "read_files": lambda params: read_files(params["file_paths"]),
+    # add_to_scratch_buffer returns None, so the confirmation message is returned
+    "add_to_scratch_buffer": lambda params: add_to_scratch_buffer(params["text"]) or "Text added to scratch buffer",
+    "get_scratch_buffer": lambda params: get_scratch_buffer(),
+}
+
 def execute_tool_call(response: str) -> str:
     """Execute the tool call with improved error handling"""
     try:
         function_name, params = extract_function_call(response)
         
-        if function_name == "list_directory":
-            files = list_files(
-                params["path"],
-                params.get("extension"),
-                params.get("recursive", False)
-            )
-            return json.dumps(files, indent=2)
-        elif function_name == "read_files":
-            file_contents = read_files(params["file_paths"])
-            return file_contents
-        elif function_name == "add_to_scratch_buffer":
-            add_to_scratch_buffer(params["text"])
-            return "Text added to scratch buffer"
-        elif function_name == "get_scratch_buffer":
-            return get_scratch_buffer()
-        else:
+        handler = _TOOL_HANDLERS.get(function_name)
+        if handler is None:
             return f"Unknown function: {function_name}"
+        return handler(params)
     except ValueError as e:
         return f"Error parsing function call: {e}\nFull response: {response}"
     except Exception as e:
         return f"Error executing tool: {e}\nFull response: {response}"
 
+# The tool set is fixed, so the prompt describing it is built once at import
+_TOOLS = [
+    create_filesystem_tool(),
+    create_file_reader_tool(),
+    create_scratch_buffer_tool(),
+    create_scratch_buffer_reader_tool()
+]
+_TOOL_PROMPT = create_tool_prompt(_TOOLS)
+
+# Reuse connections to the model server across requests
+_SESSION = requests.Session()
+_SESSION.headers.update({"Content-Type": "application/json"})
+_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+# Everything in the request body except the user prompt is fixed, so it is
+# serialized once around a placeholder and only the prompt is encoded per call
+_PROMPT_PLACEHOLDER = "\x00prompt\x00"
+
+_PAYLOAD_PREFIX, _PAYLOAD_SUFFIX = _dumps_bytes({
+    "model": "llama-3.2-3b-instruct-uncensored",
+    "messages": [
+        # Add system message to enforce proper function call format
+        {
+            "role": "system",
+            "content": "You must always include both opening and closing function tags. For example: <function=list_directory>{\"path\": \"current\"}</function>"
+        },
+        {
+            "role": "user",
+            "content": _PROMPT_PLACEHOLDER
+        },
+        {
+            "role": "user",
+            "content": _TOOL_PROMPT
+        }
+    ],
+    "temperature": 0,
+    "max_tokens": 1024,
+    "stream": False
+}).split(_dumps_bytes(_PROMPT_PLACEHOLDER))
+
 def make_chat_request(prompt, api_url="http://127.0.0.1:1234/v1/chat/completions"):
-    tools = [
-        create_filesystem_tool(),
-        create_file_reader_tool(),
-        create_scratch_buffer_tool(),
-        create_scratch_buffer_reader_tool()
-    ]
-    tool_prompt = create_tool_prompt(tools)
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    # Add system message to enforce proper function call format
-    data = {
-        "model": "llama-3.2-3b-instruct-uncensored",
-        "messages": [
-            {
-                "role": "system",
-                "content": "You must always include both opening and closing function tags. For example: <function=list_directory>{\"path\": \"current\"}</function>"
-            },
-            {
-                "role": "user",
-                "content": prompt
-            },
-            {
-                "role": "user",
-                "content": tool_prompt
-            }
-        ],
-        "temperature": 0,
-        "max_tokens": 1024,
-        "stream": False
-    }
+    # The stdlib encoder escapes to ASCII, so prompts holding lone surrogates
+    # (undecodable bytes from sys.argv) still serialize
+    data = _PAYLOAD_PREFIX + json.dumps(prompt).encode() + _PAYLOAD_SUFFIX
     
     try:
-        response = requests.post(api_url, headers=headers, json=data)
+        response = _SESSION.post(api_url, data=data)
         response.raise_for_status()
-        model_response = response.json()["choices"][0]["message"]["content"].strip()
+        model_response = _loads(response.content)["choices"][0]["message"]["content"].strip()
         
         print("Debug - Model response:", model_response)  # Debug output
         
         # If the response looks like a function call, execute it
         if model_response.startswith("<function="):
             tool_result = execute_tool_call(model_response)            
-            print("Debug - Scratch buffer:", scratch_buffer)
+            print("Debug - Scratch buffer:", get_scratch_buffer())
             return f"Model response: {model_response}\n\nTool execution result:\n{tool_result}"
         return model_response
         
     except requests.exceptions.RequestException as e:
         print(f"Error making request: {e}", file=sys.stderr)
         sys.exit(1)
-    except (KeyError, IndexError) as e:
+    except (KeyError, IndexError, ValueError) as e:
         print(f"Error parsing response: {e}", file=sys.stderr)
         sys.exit(1)
 